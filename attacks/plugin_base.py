@@ -1,7 +1,20 @@
 # attacks/plugin_base.py
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import select
+import socket
 import threading
 import time
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterable, Optional
+from utils.can_bus import make_bus
+from attacks.safety import get_safety_manager
+
+# mlockall() flags from <sys/mman.h>
+MCL_CURRENT = 1
+MCL_FUTURE = 2
 
 class AttackPlugin:
     """
@@ -9,33 +22,172 @@ class AttackPlugin:
     Subclasses must implement _run() and can optionally override configure().
     """
 
-    def __init__(self, config: Dict[str, Any] = None, dry_run: bool = True):
-        self.config = config or {}
+    def __init__(self, config: Dict[str, Any] = None, dry_run: bool = True,
+                 shared_bus=None):
+        self.config = {}
         self.dry_run = dry_run
+        # optional can.BusABC shared with other plugins (one fd per channel)
+        self.shared_bus = shared_bus
         self._stop_event = threading.Event()
+        # stop() writes a byte here so a loop blocked in _wait() wakes at once
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
         self._thread = None
+        self.configure(config)
 
     def configure(self, config: Dict[str, Any]):
-        """Apply configuration from caller/CLI"""
+        """
+        Apply configuration from caller/CLI. Subclasses normalize their keys
+        here (e.g. CAN IDs to int) so _run() never has to.
+        """
         self.config.update(config or {})
 
     def start(self):
         """Start plugin in background thread."""
         if self._thread and self._thread.is_alive():
             return
-        self._stop_event.clear()
+        self._reset_stop()
         self._thread = threading.Thread(target=self._run_wrapper, daemon=True)
         self._thread.start()
 
     def stop(self):
         """Signal thread to stop and wait."""
-        self._stop_event.set()
+        self._request_stop()
         if self._thread:
             self._thread.join(timeout=5)
 
+    async def arun(self):
+        """
+        Awaitable counterpart of start() + join(). The blocking _run() goes to
+        the loop's executor; cancelling the awaiting task stops the plugin.
+        """
+        self._reset_stop()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._run_wrapper)
+        except asyncio.CancelledError:
+            self._request_stop()
+            raise
+
+    def _request_stop(self):
+        self._stop_event.set()
+        try:
+            self._wake_w.send(b"x")
+        except OSError:
+            pass  # buffer full: a wake-up byte is already pending
+
+    def _reset_stop(self):
+        self._stop_event.clear()
+        try:
+            while self._wake_r.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _wait(self, timeout: float) -> bool:
+        """
+        Sleep up to `timeout` seconds, returning early (True) as soon as a
+        stop is requested. Replaces time.sleep() + Event.is_set() polling
+        in plugin loops with a single select() call.
+        """
+        r, _, _ = select.select([self._wake_r], [], [], max(0.0, timeout))
+        return bool(r)
+
+    def _pace(self, status: Optional[str], interval: float, duration: Optional[float],
+              send: Optional[Callable[[Any], Any]] = None, frames: Optional[list] = None) -> int:
+        """
+        Fixed-rate loop shared by the plugins (dry runs included), ticking
+        every `interval` seconds on an absolute monotonic schedule, so late
+        wake-ups do not accumulate drift, until `duration` seconds pass
+        (None: until stopped) or a stop is requested. Each tick n calls
+        send(frames[n & (len(frames) - 1)]) when prebuilt `frames` (a
+        power-of-two sized list; one entry for a constant frame) are given,
+        else send(n). The frames path binds send and the frames as locals so
+        a tick is one direct send() call. Send errors are printed and the
+        loop carries on. With a `status`, every 256th tick prints
+        "<status> (frame n)". Returns the number of ticks.
+        """
+        now = time.monotonic
+        wait = self._wait
+        deadline = now() + duration if duration else float("inf")
+        next_tick = now() + interval
+        name = self.__class__.__name__
+        sent = 0
+        if frames is not None:
+            mask = len(frames) - 1
+            while True:
+                try:
+                    send(frames[sent & mask])
+                except Exception as e:
+                    print(f"[{name}] send error: {e}")
+                if (sent & 0xFF) == 0 and status is not None:
+                    print(f"{status} (frame {sent})")
+                sent += 1
+                if wait(next_tick - now()):
+                    break
+                next_tick += interval
+                if now() >= deadline:
+                    break
+            return sent
+        while True:
+            if send is not None:
+                try:
+                    send(sent)
+                except Exception as e:
+                    print(f"[{name}] send error: {e}")
+            if status is not None and (sent & 0xFF) == 0:
+                print(f"{status} (frame {sent})")
+            sent += 1
+            if wait(next_tick - now()):
+                break
+            next_tick += interval
+            if now() >= deadline:
+                break
+        return sent
+
     def is_running(self) -> bool:
         return self._thread is not None and self._thread.is_alive()
 
+    def _get_bus(self):
+        """
+        Return the shared bus (constructor argument or config["shared_bus"])
+        if there is one, otherwise open a new bus from bustype/channel.
+        """
+        bus = self.shared_bus
+        if bus is None:
+            bus = self.config.get("shared_bus")
+        if bus is None:
+            bus = make_bus(channel=self.config.get("channel", None),
+                           bustype=self.config.get("bustype", "virtual"))
+        return bus
+
+    def _enter_realtime(self):
+        """
+        Best-effort real-time setup for the calling (plugin) thread when
+        config["realtime"] is set: SCHED_FIFO at config["rt_priority"]
+        (default 80), mlockall() to avoid page faults, and optional pinning
+        to config["cpu"]. Missing privileges or a non-Linux host leave the
+        thread on the normal scheduler.
+        """
+        cfg = self.config
+        if not cfg.get("realtime"):
+            return
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(int(cfg.get("rt_priority", 80))))
+        except (AttributeError, OSError):
+            pass
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            libc.mlockall(MCL_CURRENT | MCL_FUTURE)
+        except (AttributeError, OSError, TypeError):
+            pass
+        cpu = cfg.get("cpu")
+        if cpu is not None:
+            try:
+                os.sched_setaffinity(0, {int(cpu)})
+            except (AttributeError, OSError):
+                pass
+
     def _run_wrapper(self):
         try:
             self._run()
@@ -46,3 +198,46 @@ class AttackPlugin:
     def _run(self):
         """Main plugin logic. Subclasses MUST implement this."""
         raise NotImplementedError
+
+def run_plugins(plugins: Iterable[AttackPlugin], timeout: Optional[float] = None,
+                bus=None):
+    """
+    Launch several plugins together with asyncio.gather and wait for all of
+    them. After `timeout` seconds (or on Ctrl+C) every plugin still running
+    is told to stop. If `bus` is given it is shared by every plugin that
+    does not already have one, instead of each plugin opening its own.
+    Plugins are also stopped by the shared SafetyManager's emergency stop.
+    """
+    plugins = list(plugins)
+    if not plugins:
+        return
+    safety = get_safety_manager()
+    if safety.is_emergency_stop():
+        print("[run_plugins] emergency stop is active, not starting plugins")
+        return
+    if bus is not None:
+        for p in plugins:
+            if p.shared_bus is None:
+                p.shared_bus = bus
+
+    async def _gather():
+        # one worker per plugin so no plugin waits for a free thread
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=len(plugins)))
+        tasks = [asyncio.ensure_future(p.arun()) for p in plugins]
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    stops = [p._request_stop for p in plugins]
+    for stop in stops:
+        safety.add_stop_callback(stop)
+    try:
+        asyncio.run(_gather())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p, stop in zip(plugins, stops):
+            safety.remove_stop_callback(stop)
+            p._request_stop()
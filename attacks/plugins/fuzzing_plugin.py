@@ -1,51 +1,56 @@
 # attacks/plugins/fuzzing_plugin.py
-import time
+import os
 from typing import Dict, Any
 from attacks.plugin_base import AttackPlugin
-from utils.can_bus import make_bus
+from utils.can_bus import parse_can_id
 import can, random
 
 class FuzzingPlugin(AttackPlugin):
     """
     Payload fuzzing: send randomized payloads to chosen IDs (or random IDs).
     config:
-      bustype, channel, ids (list), duration, interval
+      bustype, channel (or shared_bus), ids (list), duration, interval
     """
+    def configure(self, config: Dict[str, Any]):
+        super().configure(config)
+        if "ids" in self.config:
+            ids = self.config["ids"]
+            if isinstance(ids, (int, str)):
+                ids = [ids]
+            self.config["ids"] = [parse_can_id(i) for i in ids]
+
     def _run(self):
         cfg = self.config
-        bustype = cfg.get("bustype", "virtual")
-        channel = cfg.get("channel", None)
         ids = cfg.get("ids", [0x100])
         interval = float(cfg.get("interval", 0.1))
         duration = cfg.get("duration", None)
 
-        if isinstance(ids, (int, str)):
-            ids = [int(ids)]
-
         if self.dry_run:
             print(f"[FuzzingPlugin] DRY RUN: fuzzing ids={ids}")
-            start = time.time()
-            while not self._stop_event.is_set():
-                print("Fuzz")
-                time.sleep(interval)
-                if duration and (time.time() - start) >= duration:
-                    break
+            self._pace("Fuzz", interval, duration)
             return
 
-        bus = make_bus(channel=channel, bustype=bustype)
-        start = time.time()
+        bus = self._get_bus()
         print(f"[FuzzingPlugin] starting fuzzing ids={ids}")
-        while not self._stop_event.is_set():
-            cid = random.choice(ids)
+        # Reuse one frame and only swap id/payload; dlc must follow the payload length
+        msg = can.Message(arbitration_id=ids[0], is_extended_id=False)
+        bus_send = bus.send
+        # Target ids come from a pre-shuffled ring (~1024 entries) instead of
+        # a random.choice() call per frame; every id keeps an equal share
+        ring = list(ids) * max(1, 1024 // len(ids))
+        random.shuffle(ring)
+        ring_len = len(ring)
+
+        def fuzz(n):
+            cid = ring[n % ring_len]
             length = random.randint(1,8)
-            payload = bytes(random.getrandbits(8) for _ in range(length))
-            msg = can.Message(arbitration_id=cid, data=payload, is_extended_id=False)
-            try:
-                bus.send(msg)
-            except Exception as e:
-                print(f"[FuzzingPlugin] send error: {e}")
-            print(f"Fuzzed id=0x{cid:x} len={length}")
-            time.sleep(interval)
-            if duration and (time.time() - start) >= duration:
-                break
-        print("[FuzzingPlugin] finished")
+            msg.arbitration_id = cid
+            msg.data = os.urandom(length)
+            msg.dlc = length
+            # only every 256th frame is echoed to the console
+            if (n & 0xFF) == 0:
+                print(f"Fuzzed id=0x{cid:x} len={length} (frame {n})")
+            bus_send(msg)
+
+        sent = self._pace(None, interval, duration, fuzz)
+        print(f"[FuzzingPlugin] finished ({sent} frames)")
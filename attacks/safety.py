@@ -3,37 +3,54 @@
 Safety and validation module for LAN Hydra attacks.
 Provides rate limiting, attack validation, and safety checks.
 """
+import os
 import time
+import atexit
 import threading
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, FrozenSet, Iterable, Callable
 from dataclasses import dataclass
+from utils.jsonl import dumps_line
 
-@dataclass
+# AttackLogger's writer thread flushes after this many seconds or bytes,
+# whichever comes first
+LOG_FLUSH_INTERVAL = 0.05
+LOG_FLUSH_BYTES = 1 << 20
+# Most log records the writer thread takes from the ring at a time
+LOG_BATCH = 256
+# Most buffers handed to one writev() call (Linux IOV_MAX)
+LOG_IOV_MAX = 1024
+
+@dataclass(slots=True)
 class SafetyLimits:
     """Safety limits for attack operations"""
     max_messages_per_second: int = 1000
     max_duration_minutes: int = 60
     max_concurrent_attacks: int = 5
-    dangerous_can_ids: List[int] = None
+    dangerous_can_ids: Optional[Iterable[int]] = None
     
     def __post_init__(self):
         if self.dangerous_can_ids is None:
             # Critical CAN IDs that should be protected
-            self.dangerous_can_ids = [
+            self.dangerous_can_ids = (
                 0x000,  # Engine control
                 0x001,  # Transmission
                 0x002,  # Brake system
                 0x003,  # Steering
                 0x100,  # Speed sensor
                 0x200,  # Safety systems
-            ]
+            )
+        # frozenset so validate_attack's membership test is a hash lookup
+        self.dangerous_can_ids: FrozenSet[int] = frozenset(self.dangerous_can_ids)
 
 class AttackValidator:
     """Validates attack parameters for safety"""
     
     def __init__(self, limits: SafetyLimits = None):
         self.limits = limits or SafetyLimits()
+        # Attacks register and unregister from their own threads; every
+        # access to active_attacks goes through _lock
         self.active_attacks = {}
+        self._lock = threading.Lock()
         
     def validate_attack(self, attack_config: Dict[str, Any]) -> tuple[bool, str]:
         """
@@ -51,60 +68,170 @@ class AttackValidator:
             return False, f"CAN ID 0x{can_id:x} is in dangerous IDs list"
             
         # Check message rate
+        # rate > max  <=>  interval * max < 1 s; compared in integer ns,
+        # the rate itself is only computed for the error message
         interval = attack_config.get("interval", 0.1)
-        rate = 1.0 / interval if interval > 0 else 0
-        if rate > self.limits.max_messages_per_second:
-            return False, f"Message rate {rate:.1f} msg/s exceeds maximum {self.limits.max_messages_per_second}"
+        if interval > 0 and int(interval * 1_000_000_000) * self.limits.max_messages_per_second < 1_000_000_000:
+            return False, f"Message rate {1.0 / interval:.1f} msg/s exceeds maximum {self.limits.max_messages_per_second}"
             
         # Check concurrent attacks
-        if len(self.active_attacks) >= self.limits.max_concurrent_attacks:
-            return False, f"Too many concurrent attacks ({len(self.active_attacks)}/{self.limits.max_concurrent_attacks})"
+        with self._lock:
+            active_count = len(self.active_attacks)
+        if active_count >= self.limits.max_concurrent_attacks:
+            return False, f"Too many concurrent attacks ({active_count}/{self.limits.max_concurrent_attacks})"
             
         return True, ""
     
     def register_attack(self, attack_id: str, config: Dict[str, Any]):
         """Register an active attack"""
-        self.active_attacks[attack_id] = {
+        entry = {
             "config": config,
             "start_time": time.time(),
             "thread": threading.current_thread()
         }
+        with self._lock:
+            self.active_attacks[attack_id] = entry
     
     def unregister_attack(self, attack_id: str):
         """Unregister a completed attack"""
-        if attack_id in self.active_attacks:
-            del self.active_attacks[attack_id]
+        with self._lock:
+            self.active_attacks.pop(attack_id, None)
 
 class RateLimiter:
-    """Rate limiter for CAN message injection"""
+    """
+    Rate limiter for CAN message injection.
+    Paces on integer monotonic nanoseconds: sleeps until SPIN_NS before the
+    next slot, then spins the rest so sleep granularity does not stretch
+    the interval.
+    """
+    
+    SPIN_NS = 500_000
     
     def __init__(self, max_rate: float = 100.0):
         self.max_rate = max_rate
-        self.last_send_time = 0
         self.min_interval = 1.0 / max_rate
+        self._min_interval_ns = int(1e9 / max_rate)
+        self._next_ns = 0
         
     def wait_if_needed(self):
         """Wait if necessary to respect rate limit"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_send_time
+        clock = time.monotonic_ns
+        next_ns = self._next_ns
+        now = clock()
+        if now < next_ns:
+            remaining = next_ns - now - self.SPIN_NS
+            if remaining > 0:
+                time.sleep(remaining / 1e9)
+            while clock() < next_ns:
+                pass
+        # stay on the absolute schedule unless we fell behind it
+        self._next_ns = max(next_ns, clock()) + self._min_interval_ns
+
+class LogRing:
+    """
+    Bounded multi-producer, single-consumer ring of log records.
+    Producers only hold the lock long enough to claim a slot; the single
+    consumer drains without it. When full, put() drops the entry (and
+    counts it) or, with drop_when_full=False, blocks until there is room;
+    either way it sets `wake` so a consumer waiting on it drains at once.
+    """
+    
+    def __init__(self, capacity: int = 1 << 15, drop_when_full: bool = True):
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError("LogRing capacity must be a power of two")
+        self._buf: List[Any] = [None] * capacity
+        self._cap = capacity
+        self._mask = capacity - 1
+        self._head = 0  # next slot to drain, consumer-owned
+        self._tail = 0  # next slot to fill, guarded by _lock
+        self._lock = threading.Lock()
+        self._not_full = None if drop_when_full else threading.Condition(self._lock)
+        self.wake = threading.Event()
+        self.dropped = 0
         
-        if time_since_last < self.min_interval:
-            sleep_time = self.min_interval - time_since_last
-            time.sleep(sleep_time)
-            
-        self.last_send_time = time.time()
+    def put(self, item: Any) -> bool:
+        """Append an item; returns False if it was dropped"""
+        with self._lock:
+            tail = self._tail
+            if tail - self._head >= self._cap:
+                self.wake.set()
+                if self._not_full is None:
+                    self.dropped += 1
+                    return False
+                while self._tail - self._head >= self._cap:
+                    self._not_full.wait()
+                tail = self._tail
+            self._buf[tail & self._mask] = item
+            self._tail = tail + 1
+        return True
+        
+    def drain(self, max_items: int = 256) -> List[Any]:
+        """Remove and return up to max_items in order (consumer only)"""
+        head = self._head
+        n = min(self._tail - head, max_items)
+        if n <= 0:
+            return []
+        buf, mask = self._buf, self._mask
+        items = []
+        for i in range(head, head + n):
+            items.append(buf[i & mask])
+            buf[i & mask] = None
+        self._head = head + n
+        if self._not_full is not None:
+            with self._lock:
+                self._not_full.notify_all()
+        return items
 
 class AttackLogger:
-    """Enhanced logging for attack analysis"""
+    """
+    Enhanced logging for attack analysis.
+    Entries are pushed onto a LogRing (per-message entries as raw tuples
+    that the writer formats); a writer thread drains it in batches into a
+    file opened once and flushes periodically. The file and the writer
+    are only set up by the first entry, so a logger that never logs
+    leaves nothing behind. Call close() to push out anything still buffered.
+    """
     
-    def __init__(self, log_file: str = "data/attack_log.json"):
+    def __init__(self, log_file: str = "data/attack_log.json",
+                 ring_capacity: int = 1 << 15, drop_when_full: bool = True):
         self.log_file = log_file
         self.session_id = int(time.time())
+        # Every line starts with the same session_id member; serialize it
+        # once and splice the per-entry fields in after it
+        self._prefix = dumps_line({"session_id": self.session_id})[:-2] + b","
+        # Raw O_APPEND descriptor; the writer thread gathers lines and
+        # submits each flush as one vectored write. Both start in _start()
+        self._fd: Optional[int] = None
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._ring = LogRing(ring_capacity, drop_when_full)
+        self._closing = threading.Event()
+
+    def _start(self) -> bool:
+        """Open the log and start the writer for the first entry; False once closed"""
+        with self._start_lock:
+            if self._closed:
+                return False
+            if self._writer is None:
+                log_dir = os.path.dirname(self.log_file)
+                if log_dir:
+                    os.makedirs(log_dir, exist_ok=True)
+                self._fd = os.open(self.log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                writer = threading.Thread(target=self._drain, name="attack-log-writer", daemon=True)
+                writer.start()
+                self._writer = writer
+                atexit.register(self.close)
+        return True
+
+    @property
+    def dropped(self) -> int:
+        """Entries discarded because the ring was full"""
+        return self._ring.dropped
         
     def log_attack_start(self, attack_type: str, config: Dict[str, Any]):
         """Log attack start"""
         log_entry = {
-            "session_id": self.session_id,
             "timestamp": time.time(),
             "event": "attack_start",
             "attack_type": attack_type,
@@ -115,7 +242,6 @@ class AttackLogger:
     def log_attack_end(self, attack_type: str, success: bool, message_count: int = 0):
         """Log attack end"""
         log_entry = {
-            "session_id": self.session_id,
             "timestamp": time.time(),
             "event": "attack_end",
             "attack_type": attack_type,
@@ -125,24 +251,91 @@ class AttackLogger:
         self._write_log(log_entry)
         
     def log_message_sent(self, can_id: int, payload: bytes, success: bool):
-        """Log individual message"""
-        log_entry = {
-            "session_id": self.session_id,
-            "timestamp": time.time(),
+        """
+        Log individual message. Only the raw fields are queued here; the
+        writer thread formats and serializes them off the send path.
+        """
+        if self._writer is not None or self._start():
+            # bytes() snapshots reused bytearray payloads (no copy for bytes)
+            self._ring.put((time.time(), can_id, bytes(payload), success))
+
+    def _format_message(self, record: tuple) -> bytes:
+        """Serialize a queued log_message_sent record (writer thread)"""
+        timestamp, can_id, payload, success = record
+        return self._prefix + dumps_line({
+            "timestamp": timestamp,
             "event": "message_sent",
             "can_id": f"0x{can_id:x}",
             "payload": payload.hex(),
             "success": success
-        }
-        self._write_log(log_entry)
+        })[1:]
         
     def _write_log(self, log_entry: dict):
-        """Write log entry to file"""
-        import json
-        import os
-        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
-        with open(self.log_file, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+        """Serialize a log entry behind the session prefix and queue it"""
+        if self._writer is not None or self._start():
+            self._ring.put(self._prefix + dumps_line(log_entry)[1:])
+
+    def _drain(self):
+        """Writer thread: gather lines and write them out every 50 ms or 1 MiB"""
+        drain = self._ring.drain
+        wake = self._ring.wake
+        fmt = self._format_message
+        closing = self._closing
+        lines: List[bytes] = []
+        pending = 0
+        last_flush = time.monotonic()
+        while True:
+            batch = drain(LOG_BATCH)
+            if batch:
+                # entries are pre-serialized bytes or raw message tuples
+                for item in batch:
+                    line = item if item.__class__ is bytes else fmt(item)
+                    lines.append(line)
+                    pending += len(line)
+            elif closing.is_set():
+                break
+            else:
+                # a full ring or close() cuts the wait short
+                wake.wait(LOG_FLUSH_INTERVAL)
+                wake.clear()
+            now = time.monotonic()
+            if pending and (pending >= LOG_FLUSH_BYTES or now - last_flush >= LOG_FLUSH_INTERVAL):
+                self._write_lines(lines)
+                lines = []
+                pending = 0
+                last_flush = now
+        if lines:
+            self._write_lines(lines)
+
+    def _write_lines(self, lines: List[bytes]):
+        """Append lines with one writev() per LOG_IOV_MAX buffers"""
+        fd = self._fd
+        writev = getattr(os, "writev", None)
+        for i in range(0, len(lines), LOG_IOV_MAX):
+            chunk = lines[i:i + LOG_IOV_MAX]
+            if writev is None:
+                view = memoryview(b"".join(chunk))
+            else:
+                written = writev(fd, chunk)
+                total = sum(map(len, chunk))
+                if written == total:
+                    continue
+                view = memoryview(b"".join(chunk))[written:]  # short write
+            while view:
+                view = view[os.write(fd, view):]
+
+    def close(self):
+        """Stop the writer thread and flush and close the log file"""
+        with self._start_lock:
+            self._closed = True
+            writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        self._closing.set()
+        self._ring.wake.set()
+        writer.join()
+        os.close(self._fd)
+        self._fd = None
 
 class SafetyManager:
     """Central safety management for all attacks"""
@@ -151,7 +344,13 @@ class SafetyManager:
         self.validator = AttackValidator()
         self.rate_limiter = RateLimiter()
         self.logger = AttackLogger()
+        # Attack loops poll the plain flag; the Event is only for code
+        # that wants to block until a stop happens
+        self._stop = False
         self.emergency_stop = threading.Event()
+        # Called by emergency_stop_all so running attacks stop right away
+        self._stop_callbacks: List[Callable[[], None]] = []
+        self._callbacks_lock = threading.Lock()
         
     def validate_and_log_attack(self, attack_type: str, config: Dict[str, Any]) -> tuple[bool, str]:
         """Validate attack and log start"""
@@ -172,9 +371,39 @@ class SafetyManager:
         
     def emergency_stop_all(self):
         """Emergency stop all attacks"""
+        self._stop = True
         self.emergency_stop.set()
         print("EMERGENCY STOP ACTIVATED - All attacks will be terminated")
+        with self._callbacks_lock:
+            callbacks = list(self._stop_callbacks)
+        for callback in callbacks:
+            callback()
+        
+    def add_stop_callback(self, callback: Callable[[], None]):
+        """Have emergency_stop_all call `callback` (e.g. a plugin's stop)"""
+        with self._callbacks_lock:
+            self._stop_callbacks.append(callback)
+        
+    def remove_stop_callback(self, callback: Callable[[], None]):
+        """Undo add_stop_callback once the attack has finished"""
+        with self._callbacks_lock:
+            if callback in self._stop_callbacks:
+                self._stop_callbacks.remove(callback)
         
     def is_emergency_stop(self) -> bool:
         """Check if emergency stop is active"""
-        return self.emergency_stop.is_set() 
\ No newline at end of file
+        return self._stop
+
+# Process-wide SafetyManager shared by the CLI and all plugins, created on
+# first use so importing this module opens no files
+_SINGLETON: Optional[SafetyManager] = None
+_SINGLETON_LOCK = threading.Lock()
+
+def get_safety_manager() -> SafetyManager:
+    """Return the shared SafetyManager, creating it on first call"""
+    global _SINGLETON
+    if _SINGLETON is None:
+        with _SINGLETON_LOCK:
+            if _SINGLETON is None:
+                _SINGLETON = SafetyManager()
+    return _SINGLETON
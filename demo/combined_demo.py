@@ -4,6 +4,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 # demo/combined_demo.py
 import threading
 import time
+import can
 from utils.can_bus import make_bus
 
 BUS_BUSTYPE = "virtual"
@@ -11,29 +12,50 @@ CHANNEL = None
 
 def ecu_loop(bus, stop_event):
     msg_id = 0x100
+    msg = can.Message(arbitration_id=msg_id, data=bytearray(1), is_extended_id=False)
+    send = bus.send
     while not stop_event.is_set():
-        import can
-        msg = can.Message(arbitration_id=msg_id, data=[0x32], is_extended_id=False)
-        bus.send(msg)
+        msg.data[0] = 0x32
+        send(msg)
         print("ECU: sent speed=50")
         time.sleep(1)
 
 def injector_loop(bus, value=220, interval=0.2, duration=6):
     msg_id = 0x100
-    end = time.time() + duration
-    import can
-    while time.time() < end:
-        msg = can.Message(arbitration_id=msg_id, data=[value], is_extended_id=False)
-        bus.send(msg)
+    send = bus.send
+    Message = can.Message
+    deadline_ns = time.monotonic_ns() + int(duration * 1e9)
+    while time.monotonic_ns() < deadline_ns:
+        msg = Message(arbitration_id=msg_id, data=[value], is_extended_id=False)
+        send(msg)
         print("Injected", value)
         time.sleep(interval)
 
 def monitor_loop(bus, stop_event):
-    print("Monitor started (prints all frames)")
+    print("Monitor started (prints all frames)", flush=True)
+    recv = bus.recv
+    # collect lines and write them to stdout every 100 frames or 10 ms
+    out = sys.stdout.buffer
+    buf = bytearray()
+    pending = 0
+    now = time.monotonic
+    last_flush = now()
     while not stop_event.is_set():
-        msg = bus.recv(timeout=1.0)
+        msg = recv(timeout=0.01 if buf else 1.0)
         if msg is not None:
-            print(f"[MON] ID=0x{msg.arbitration_id:X} LEN={msg.dlc} DATA={msg.data.hex()}")
+            buf += f"[MON] ID=0x{msg.arbitration_id:X} LEN={msg.dlc} DATA={msg.data.hex()}\n".encode()
+            pending += 1
+        if buf and (pending >= 100 or now() - last_flush > 0.01):
+            sys.stdout.flush()
+            out.write(buf)
+            out.flush()
+            buf.clear()
+            pending = 0
+            last_flush = now()
+    if buf:
+        sys.stdout.flush()
+        out.write(buf)
+        out.flush()
 
 def main():
     bus = make_bus(channel=CHANNEL, bustype=BUS_BUSTYPE)
@@ -14,11 +14,12 @@ def run(bustype: str = "virtual", channel: str | None = None, interval: float =
     os.makedirs("data", exist_ok=True)
     print(f"# ECU (speed) starting — bustype={bustype}, channel={channel}")
     bus = make_bus(channel=channel, bustype=bustype)
+    # one frame reused for every publish; only its payload byte changes
+    msg = can.Message(arbitration_id=DEFAULT_ID, data=bytearray(1), is_extended_id=False)
     try:
         while True:
             speed = DEFAULT_SPEED
-            payload = bytes([int(speed) & 0xFF])
-            msg = can.Message(arbitration_id=DEFAULT_ID, data=payload, is_extended_id=False)
+            msg.data[0] = int(speed) & 0xFF
             try:
                 bus.send(msg)
                 print(f"ECU: sent speed={speed}")
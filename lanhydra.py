@@ -3,7 +3,9 @@ import argparse
 import sys
 import os
 import json
-from typing import Dict, Any
+from collections import ChainMap
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, Optional
 
 # Ensure repo root is on sys.path
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
@@ -12,9 +14,11 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 from ecus import speed_ecu
 from monitor import monitor_bus
 from attacks import injection
+from attacks.plugin_base import run_plugins
 from attacks.plugins.injection_plugin import InjectionPlugin
 from attacks.plugins.flooding_plugin import FloodingPlugin
 from attacks.plugins.fuzzing_plugin import FuzzingPlugin
+from utils.can_bus import parse_can_id
 
 class AttackManager:
     """Manages multiple attack scenarios and profiles"""
@@ -22,9 +26,15 @@ class AttackManager:
     def __init__(self):
         self.active_attacks = {}
         self.profiles = self._load_attack_profiles()
+        # profile attack_type -> handler(config, dry_run)
+        self._dispatch = {
+            "injection": self._handle_injection,
+            "flooding": self._handle_flooding,
+            "replay": self._handle_replay,
+        }
     
     def _load_attack_profiles(self) -> Dict[str, Dict[str, Any]]:
-        """Load predefined attack profiles"""
+        """Load predefined attack profiles (configs are read-only mappings)"""
         profiles = {
             "speed_spoof": {
                 "description": "Spoof speed sensor readings",
@@ -64,11 +74,14 @@ class AttackManager:
                 }
             }
         }
+        for profile in profiles.values():
+            profile["config"] = MappingProxyType(profile["config"])
         return profiles
     
     def run_profile(self, profile_name: str, bustype: str = "virtual", 
-                   channel: str = None, dry_run: bool = False):
-        """Run a predefined attack profile"""
+                   channel: str = None, dry_run: bool = False,
+                   duration: Optional[int] = None):
+        """Run a predefined attack profile, optionally overriding its duration"""
         if profile_name not in self.profiles:
             print(f"Unknown profile: {profile_name}")
             print(f"Available profiles: {list(self.profiles.keys())}")
@@ -78,47 +91,122 @@ class AttackManager:
         print(f"Running attack profile: {profile_name}")
         print(f"Description: {profile['description']}")
         
-        config = profile["config"].copy()
-        config.update({"bustype": bustype, "channel": channel})
+        # overrides sit in front of the shared defaults instead of copying them
+        overrides = {"bustype": bustype, "channel": channel}
+        if duration:
+            overrides["duration"] = duration
+        config: Mapping[str, Any] = ChainMap(overrides, profile["config"])
         
-        if profile["attack_type"] == "injection":
-            if "ids" in config:
-                # Lateral movement attack
-                injector = injection.AdvancedInjector(bustype=bustype, channel=channel)
-                injector.lateral_movement_attack(
-                    config["ids"], 
-                    config.get("pattern", "escalate"),
-                    config["duration"],
-                    dry_run
-                )
-            else:
-                # Basic injection
-                injector = injection.AdvancedInjector(bustype=bustype, channel=channel)
-                injector.basic_injection(
-                    config["id"], 
-                    config["value"],
-                    config["duration"],
-                    config.get("interval", 0.1),
-                    dry_run
-                )
-        elif profile["attack_type"] == "flooding":
-            plugin = FloodingPlugin(config, dry_run)
-            plugin.start()
-            try:
-                plugin._thread.join(timeout=config["duration"])
-            except KeyboardInterrupt:
-                pass
-            finally:
-                plugin.stop()
-        elif profile["attack_type"] == "replay":
-            injector = injection.AdvancedInjector(bustype=bustype, channel=channel)
-            injector.replay_attack(
-                config["log_file"],
+        handler = self._dispatch.get(profile["attack_type"])
+        if handler is None:
+            print(f"Unsupported attack type: {profile['attack_type']}")
+            return
+        handler(config, dry_run)
+
+    def _handle_injection(self, config: Mapping[str, Any], dry_run: bool):
+        injector = injection.AdvancedInjector(bustype=config["bustype"], channel=config["channel"])
+        if "ids" in config:
+            # Lateral movement attack
+            injector.lateral_movement_attack(
+                config["ids"], 
+                config.get("pattern", "escalate"),
+                config["duration"],
+                dry_run
+            )
+        else:
+            # Basic injection
+            injector.basic_injection(
+                config["id"], 
+                config["value"],
                 config["duration"],
-                config.get("speed", 1.0),
+                config.get("interval", 0.1),
                 dry_run
             )
 
+    def _handle_flooding(self, config: Mapping[str, Any], dry_run: bool):
+        run_plugins([FloodingPlugin(config, dry_run)], timeout=config["duration"])
+
+    def _handle_replay(self, config: Mapping[str, Any], dry_run: bool):
+        injector = injection.AdvancedInjector(bustype=config["bustype"], channel=config["channel"])
+        injector.replay_attack(
+            config["log_file"],
+            config["duration"],
+            config.get("speed", 1.0),
+            dry_run
+        )
+
+def _hex_int(value: str) -> int:
+    """argparse type: one hex CAN ID, parsed once when arguments are bound"""
+    return parse_can_id(value)
+
+def _hex_int_list(value: str) -> List[int]:
+    """argparse type: comma-separated hex CAN IDs"""
+    return [parse_can_id(part.strip()) for part in value.split(",")]
+
+def _attack_injection(args, parser):
+    # Legacy injection
+    injection.run(duration=args.duration, value=args.value,
+                 bustype=args.bustype, channel=args.channel)
+
+def _attack_advanced(args, parser):
+    if not args.attack:
+        parser.error("Advanced attack requires --attack parameter")
+        
+    injector = injection.AdvancedInjector(bustype=args.bustype, channel=args.channel)
+    can_id = args.id
+    
+    if args.attack == "basic":
+        if can_id is None or args.value is None:
+            parser.error("Basic attack requires --id and --value")
+        injector.basic_injection(can_id, args.value, args.duration,
+                               args.interval, args.dry_run)
+                               
+    elif args.attack == "spoof":
+        if can_id is None or args.spoof_value is None or args.original_value is None:
+            parser.error("Spoof attack requires --id, --spoof-value, and --original-value")
+        injector.spoofing_attack(can_id, args.spoof_value, args.original_value,
+                               args.duration, args.interval, args.dry_run)
+                               
+    elif args.attack == "replay":
+        if not args.log_file:
+            parser.error("Replay attack requires --log-file")
+        injector.replay_attack(args.log_file, args.duration, args.speed, args.dry_run)
+        
+    elif args.attack == "lateral":
+        if not args.targets:
+            parser.error("Lateral movement requires --targets")
+        injector.lateral_movement_attack(args.targets, args.pattern,
+                                       args.duration, args.dry_run)
+
+def _attack_flooding(args, parser):
+    config = {
+        "bustype": args.bustype,
+        "channel": args.channel,
+        "id": args.id if args.id is not None else 0x100,
+        "rate": 100.0,
+        "duration": args.duration,
+        "realtime": args.realtime
+    }
+    run_plugins([FloodingPlugin(config, args.dry_run)], timeout=args.duration)
+
+def _attack_fuzzing(args, parser):
+    config = {
+        "bustype": args.bustype,
+        "channel": args.channel,
+        "ids": [args.id] if args.id is not None else [0x100],
+        "interval": args.interval,
+        "duration": args.duration
+    }
+    run_plugins([FuzzingPlugin(config, args.dry_run)], timeout=args.duration)
+
+# attack --type -> handler(args, parser); keys are the --type choices
+ATTACK_HANDLERS = {
+    "injection": _attack_injection,
+    "flooding": _attack_flooding,
+    "fuzzing": _attack_fuzzing,
+    "advanced": _attack_advanced,
+}
+
 def main():
     parser = argparse.ArgumentParser(
         description="LAN Hydra - Internal Threat Simulation Toolkit for Vehicle Networks",
@@ -159,19 +247,25 @@ Examples:
     mon_parser.add_argument("--channel", default=None, help="Channel (default: None)")
     mon_parser.add_argument("--filter", help="Filter CAN IDs (comma-separated hex values)")
     mon_parser.add_argument("--output", default="data/monitor.log", help="Output log file")
+    mon_parser.add_argument("--verbose", action="store_true", help="Print every received frame")
+    mon_parser.add_argument("--format", choices=["jsonl", "msgpack", "columnar"], default="jsonl",
+                            help="Log format: JSON lines (default), compact msgpack records, "
+                                 "or columnar binary blocks")
     
     # Attack subcommand
     attack_parser = subparsers.add_parser("attack", help="Execute attack scenarios")
-    attack_parser.add_argument("--type", choices=["injection", "flooding", "fuzzing", "advanced"], 
+    attack_parser.add_argument("--type", choices=list(ATTACK_HANDLERS), 
                               required=True, help="Attack type")
     attack_parser.add_argument("--bustype", default="virtual", help="Bus type (default: virtual)")
     attack_parser.add_argument("--channel", default=None, help="Channel (default: None)")
     attack_parser.add_argument("--dry-run", action="store_true", help="Simulate without sending")
+    attack_parser.add_argument("--realtime", action="store_true",
+                              help="Run flooding under SCHED_FIFO with locked memory (needs privileges)")
     
     # Advanced attack arguments
     attack_parser.add_argument("--attack", choices=["basic", "spoof", "replay", "lateral"],
                               help="Advanced attack subtype")
-    attack_parser.add_argument("--id", help="CAN ID (hex format)")
+    attack_parser.add_argument("--id", type=_hex_int, help="CAN ID (hex format)")
     attack_parser.add_argument("--value", type=int, help="Payload value")
     attack_parser.add_argument("--duration", type=int, required=True, help="Attack duration (seconds)")
     attack_parser.add_argument("--interval", type=float, default=0.1, help="Injection interval")
@@ -185,7 +279,7 @@ Examples:
     attack_parser.add_argument("--speed", type=float, default=1.0, help="Replay speed")
     
     # Lateral movement arguments
-    attack_parser.add_argument("--targets", help="Target CAN IDs (comma-separated)")
+    attack_parser.add_argument("--targets", type=_hex_int_list, help="Target CAN IDs (comma-separated)")
     attack_parser.add_argument("--pattern", choices=["escalate", "random", "sequential"],
                               default="escalate", help="Attack pattern")
     
@@ -208,84 +302,16 @@ Examples:
         
     elif args.command == "monitor":
         # Enhanced monitoring could be added here
-        monitor_bus.run(bustype=args.bustype, channel=args.channel)
+        monitor_bus.run(bustype=args.bustype, channel=args.channel, verbose=args.verbose,
+                        fmt=args.format)
         
     elif args.command == "attack":
-        if args.type == "injection":
-            # Legacy injection
-            injection.run(duration=args.duration, value=args.value,
-                         bustype=args.bustype, channel=args.channel)
-                         
-        elif args.type == "advanced":
-            if not args.attack:
-                parser.error("Advanced attack requires --attack parameter")
-                
-            injector = injection.AdvancedInjector(bustype=args.bustype, channel=args.channel)
-            
-            if args.attack == "basic":
-                if not args.id or args.value is None:
-                    parser.error("Basic attack requires --id and --value")
-                injector.basic_injection(args.id, args.value, args.duration,
-                                       args.interval, args.dry_run)
-                                       
-            elif args.attack == "spoof":
-                if not args.id or args.spoof_value is None or args.original_value is None:
-                    parser.error("Spoof attack requires --id, --spoof-value, and --original-value")
-                injector.spoofing_attack(args.id, args.spoof_value, args.original_value,
-                                       args.duration, args.interval, args.dry_run)
-                                       
-            elif args.attack == "replay":
-                if not args.log_file:
-                    parser.error("Replay attack requires --log-file")
-                injector.replay_attack(args.log_file, args.duration, args.speed, args.dry_run)
-                
-            elif args.attack == "lateral":
-                if not args.targets:
-                    parser.error("Lateral movement requires --targets")
-                target_ids = [int(id.strip(), 16) for id in args.targets.split(",")]
-                injector.lateral_movement_attack(target_ids, args.pattern,
-                                               args.duration, args.dry_run)
-                                               
-        elif args.type == "flooding":
-            config = {
-                "bustype": args.bustype,
-                "channel": args.channel,
-                "id": int(args.id, 16) if args.id else 0x100,
-                "rate": 100.0,
-                "duration": args.duration
-            }
-            plugin = FloodingPlugin(config, args.dry_run)
-            plugin.start()
-            try:
-                plugin._thread.join(timeout=args.duration)
-            except KeyboardInterrupt:
-                pass
-            finally:
-                plugin.stop()
-                
-        elif args.type == "fuzzing":
-            config = {
-                "bustype": args.bustype,
-                "channel": args.channel,
-                "ids": [int(args.id, 16)] if args.id else [0x100],
-                "interval": args.interval,
-                "duration": args.duration
-            }
-            plugin = FuzzingPlugin(config, args.dry_run)
-            plugin.start()
-            try:
-                plugin._thread.join(timeout=args.duration)
-            except KeyboardInterrupt:
-                pass
-            finally:
-                plugin.stop()
+        ATTACK_HANDLERS[args.type](args, parser)
                 
     elif args.command == "profile":
         manager = AttackManager()
-        if args.duration:
-            # Override profile duration
-            manager.profiles[args.name]["config"]["duration"] = args.duration
-        manager.run_profile(args.name, args.bustype, args.channel, args.dry_run)
+        manager.run_profile(args.name, args.bustype, args.channel, args.dry_run,
+                            duration=args.duration)
         
     elif args.command == "list-profiles":
         manager = AttackManager()
@@ -295,7 +321,7 @@ Examples:
             print(f"Name: {name}")
             print(f"Description: {profile['description']}")
             print(f"Type: {profile['attack_type']}")
-            print(f"Config: {profile['config']}")
+            print(f"Config: {dict(profile['config'])}")
             print("-" * 30)
 
 if __name__ == "__main__":
@@ -1,31 +1,234 @@
 # monitor/monitor_bus.py
 import can
-import json
 import time
 import os
-from utils.can_bus import make_bus
+import select
+import socket
+import threading
+from binascii import hexlify
+from collections import deque
+from utils.can_bus import make_bus, make_raw_socketcan, unpack_frames, CAN_FRAME
+from utils import can_log
 
-def run(bustype="virtual", channel=None):
-    log_path = os.path.join("data", "monitor.log")
-    os.makedirs("data", exist_ok=True)
+try:
+    import msgpack
+except ImportError:  # only needed for fmt="msgpack"
+    msgpack = None
 
-    print(f"# Monitor will append JSON lines to {log_path}")
-    with open(log_path, "a") as logfile:
-        bus = make_bus(channel=channel, bustype=bustype)
-        print("Monitoring CAN bus... Press Ctrl+C to exit")
+# The writer thread wakes this often to serialize and write pending frames
+FLUSH_INTERVAL = 0.05
+# Buffered lines go to the kernel when a wake-up finds the bus idle, when
+# the log buffer fills, or at the latest after MAX_FLUSH_DELAY seconds
+LOG_BUFFER_SIZE = 1 << 20
+MAX_FLUSH_DELAY = 1.0
+# Frames held for the writer; past this the oldest are dropped so a slow
+# disk never blocks reception
+QUEUE_SIZE = 1 << 16
+# Raw socket path: frames read per wake-up once the socket is readable, and
+# the kernel receive buffer asked for so bursts queue up instead of dropping
+RECV_BATCH = 64
+RAW_RCVBUF = 1 << 20
+
+# One JSON log line (timestamp, arbitration_id, hex data), filled in with
+# bytes %-formatting so a frame never goes through a dict or a str
+LINE = b'{"timestamp":%a,"arbitration_id":%d,"data":"%s"}\n'
+
+# Log file per output format. A msgpack log is a stream msgpack.Unpacker
+# reads back: each run writes a {"base_ns": wall clock ns} header, then
+# (ns since the previous record, id, data) arrays, so timestamps pack as
+# small ints. columnar is the utils.can_log block format
+LOG_PATHS = {
+    "jsonl": os.path.join("data", "monitor.log"),
+    "msgpack": os.path.join("data", "monitor.msgpack"),
+    "columnar": os.path.join("data", "monitor.canlog"),
+}
+
+# Encoders turn a batch of (timestamp, id, data) tuples into one chunk of
+# log bytes, so the per-frame work is a single comprehension step
+def _encode_jsonl(frames):
+    line = LINE
+    return b"".join([line % (t, arb, hexlify(data)) for t, arb, data in frames])
+
+def _msgpack_encoder():
+    """Encoder for frames stamped with time.monotonic_ns()"""
+    pack = msgpack.Packer(use_bin_type=True).pack
+    prev = time.monotonic_ns()
+    header = pack({"base_ns": time.time_ns()})  # wall clock at `prev`
+    def encode(frames):
+        nonlocal prev, header
+        out = [header]
+        header = b""
+        take = out.append
+        for t, arb, data in frames:
+            take(pack((t - prev, arb, bytes(data))))
+            prev = t
+        return b"".join(out)
+    return encode
+
+def _writer(pending, logfile, stop, verbose, encode):
+    """Drain (timestamp, id, data) tuples, encode each batch and write it at once"""
+    popleft = pending.popleft
+    now = time.monotonic
+    unflushed = False
+    last_flush = now()
+    while True:
+        stopping = stop.wait(FLUSH_INTERVAL)
+        frames = []
+        take = frames.append
         try:
             while True:
-                msg = bus.recv(timeout=1)
-                if msg is None:
+                take(popleft())
+        except IndexError:
+            pass
+        if frames:
+            chunk = encode(frames)
+            logfile.write(chunk)
+            unflushed = True
+            if verbose:
+                if encode is _encode_jsonl:
+                    print(chunk.decode(), end="")
+                else:
+                    print(f"# wrote {len(frames)} records")
+        if unflushed and (not frames or stopping or now() - last_flush >= MAX_FLUSH_DELAY):
+            logfile.flush()
+            unflushed = False
+            last_flush = now()
+        if stopping:
+            break
+
+class _PendingListener(can.Listener):
+    """
+    Queues (clock(), id, data) for every frame a can.Notifier delivers.
+    A receive error ends the Notifier's thread, so it is kept in `error`
+    and `stop` is set to end the monitor.
+    """
+
+    def __init__(self, pending, clock, stop):
+        self._pending = pending
+        self._push = pending.append
+        self._clock = clock
+        self._stop = stop
+        self.dropped = 0
+        self.error = None
+
+    def on_message_received(self, msg):
+        if len(self._pending) == QUEUE_SIZE:
+            self.dropped += 1  # append below evicts the oldest frame
+        self._push((self._clock(), msg.arbitration_id, msg.data))
+
+    def on_error(self, exc):
+        self.error = exc
+        self._stop.set()
+
+def _raw_receiver(sock, clock):
+    """
+    receive() straight off a CAN_RAW socket, returning a list of
+    (clock(), id, data) frames (empty after a second with nothing on the
+    bus). One select() waits for the socket, then up to RECV_BATCH queued
+    frames are read non-blocking into consecutive slots of one
+    preallocated buffer and decoded together; no python-can Message is
+    built per frame.
+    """
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RAW_RCVBUF)
+    except OSError:
+        pass  # keep the default buffer
+    sock.setblocking(False)
+    size = CAN_FRAME.size
+    view = memoryview(bytearray(RECV_BATCH * size))
+    slots = [view[k * size:(k + 1) * size] for k in range(RECV_BATCH)]
+    recv_into = sock.recv_into
+    wait = select.select
+    rlist = [sock]
+    def receive():
+        if not wait(rlist, (), (), 1)[0]:
+            return ()
+        stamps = []
+        stamp = stamps.append
+        n = 0
+        while n < RECV_BATCH:
+            try:
+                if recv_into(slots[n]) < size:
                     continue
-                # Save message in JSON format
-                log_entry = {
-                    "timestamp": time.time(),
-                    "arbitration_id": msg.arbitration_id,
-                    "data": msg.data.hex()
-                }
-                logfile.write(json.dumps(log_entry) + "\n")
-                logfile.flush()
-                print(log_entry)
+            except BlockingIOError:
+                break
+            stamp(clock())
+            n += 1
+        # None is an error frame
+        return [(t, frame[0], frame[1])
+                for t, frame in zip(stamps, unpack_frames(view[:n * size]))
+                if frame is not None]
+    return receive
+
+def run(bustype="virtual", channel=None, verbose=False, fmt="jsonl"):
+    # frames are stamped with wall clock seconds, or monotonic ns for the
+    # msgpack encoder's deltas
+    clock = time.time
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("msgpack output needs the msgpack package (pip install msgpack)")
+        encode = _msgpack_encoder()
+        clock = time.monotonic_ns
+    elif fmt == "jsonl":
+        encode = _encode_jsonl
+    elif fmt == "columnar":
+        encode = can_log.encode_block
+    else:
+        raise ValueError(f"Unknown monitor log format: {fmt}")
+    log_path = LOG_PATHS[fmt]
+    os.makedirs("data", exist_ok=True)
+
+    print(f"# Monitor will append {fmt} records to {log_path}")
+    fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "ab", buffering=LOG_BUFFER_SIZE) as logfile:
+        if fmt == "columnar" and os.fstat(fd).st_size == 0:
+            logfile.write(can_log.MAGIC)
+        # on socketcan read frames off a raw socket; anything else (or if
+        # the raw socket cannot be opened) goes through python-can
+        raw = make_raw_socketcan(channel) if bustype == "socketcan" else None
+        bus = None if raw is not None else make_bus(channel=channel, bustype=bustype, cached=False)
+        print("Monitoring CAN bus... Press Ctrl+C to exit")
+        # receivers only queue raw fields; formatting and disk writes
+        # happen on the writer thread
+        pending = deque(maxlen=QUEUE_SIZE)
+        stop = threading.Event()
+        writer = threading.Thread(target=_writer, args=(pending, logfile, stop, verbose, encode),
+                                  daemon=True)
+        writer.start()
+        notifier = listener = None
+        dropped = 0
+        try:
+            if bus is not None:
+                # python-can's Notifier thread receives and hands each
+                # frame to the listener; this thread just waits for Ctrl+C
+                listener = _PendingListener(pending, clock, stop)
+                notifier = can.Notifier(bus, [listener], timeout=1.0)
+                stop.wait()
+                # only on_error sets stop before Ctrl+C; fail as recv() would
+                raise listener.error
+            else:
+                receive = _raw_receiver(raw, clock)
+                push = pending.extend
+                while True:
+                    frames = receive()
+                    if not frames:
+                        continue
+                    # extend below evicts the oldest frames past QUEUE_SIZE
+                    overflow = len(pending) + len(frames) - QUEUE_SIZE
+                    if overflow > 0:
+                        dropped += overflow
+                    push(frames)
         except KeyboardInterrupt:
             print("Stopped monitoring")
+        finally:
+            if notifier is not None:
+                notifier.stop()
+                dropped += listener.dropped
+            stop.set()
+            writer.join()
+            if raw is not None:
+                raw.close()
+            if bus is not None:
+                bus.shutdown()
+            if dropped:
+                print(f"# Monitor dropped {dropped} frames (writer fell behind)")
@@ -1,24 +1,278 @@
 # tools/detect_spoof.py
-import json, sys
+import hashlib, os, struct, sys
+from array import array
 from collections import deque
+from itertools import compress
+from operator import sub
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.can_bus import parse_can_id
+from utils import can_log
+from utils.jsonl import loads
+
+try:
+    import msgpack
+except ImportError:  # only needed for msgpack monitor logs
+    msgpack = None
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:  # optional speedup for very large logs
+    njit = None
 
 LOG = "data/monitor.log"
+# Parsed (id, value, time) columns are kept next to the log in
+# <log>.cache, with how far into the log they reach, so a rerun only
+# parses lines appended since the last one. `state` is what the parser
+# needs to carry on from there (the msgpack timestamp base), else 0.
+# The fingerprint hashes the log's first and last FINGERPRINT_SIZE bytes
+# before that offset, so a log deleted and recreated (possibly with the
+# same inode) or truncated and regrown does not reuse the cache. mtime
+# and ctime change on every append, so they cannot tell these apart
+CACHE_MAGIC = b"LHSPOOF5"
+# magic, log inode, log offset, fingerprint, record count, state
+CACHE_HEADER = struct.Struct("<8sQQQQQ")
+FINGERPRINT_SIZE = 4096
+# Bytes read from the log per chunk while parsing
+READ_CHUNK = 1 << 20
+# First byte of a msgpack monitor log: the {"base_ns": ...} header map
+MSGPACK_HEADER = b"\x81"
+# Alerts per stdout write + flush with stream=True
+STREAM_BATCH = 100
 
 def hex_to_int(h): return int(h, 16)
 
-def detect(threshold_delta=50, target_id="0x100"):
-    with open(LOG) as f:
-        last = None
-        for line in f:
-            rec = json.loads(line)
-            if rec["id"] != target_id:
+def _empty_columns():
+    return array("I"), array("Q"), array("d")
+
+def _fingerprint(log, offset):
+    """Hash of the first and last FINGERPRINT_SIZE bytes of log[:offset]"""
+    h = hashlib.blake2b(digest_size=8)
+    log.seek(0)
+    h.update(log.read(min(offset, FINGERPRINT_SIZE)))
+    start = max(0, offset - FINGERPRINT_SIZE)
+    log.seek(start)
+    h.update(log.read(offset - start))
+    return int.from_bytes(h.digest(), "little")
+
+def _read_cache(cache, st, log):
+    """Cached columns, log offset and parser state, or empty ones if the cache is missing or stale"""
+    try:
+        with open(cache, "rb") as f:
+            magic, inode, offset, fingerprint, count, state = CACHE_HEADER.unpack(
+                f.read(CACHE_HEADER.size))
+            if (magic != CACHE_MAGIC or inode != st.st_ino or offset > st.st_size
+                    or fingerprint != _fingerprint(log, offset)):
+                raise ValueError("stale cache")
+            columns = _empty_columns()
+            for col in columns:
+                col.fromfile(f, count)
+            return columns, offset, state
+    except (OSError, ValueError, EOFError, struct.error):
+        return _empty_columns(), 0, 0
+
+def _write_cache(cache, st, log, columns, offset, state):
+    """Best effort: a log in a directory we cannot write to just goes uncached"""
+    tmp = cache + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, st.st_ino, offset, _fingerprint(log, offset),
+                                      len(columns[0]), state))
+            for col in columns:
+                col.tofile(f)
+        os.replace(tmp, cache)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+# Parsers append the records found from `offset` on to the columns and
+# return (new offset, state)
+def _parse_jsonl(f, offset, columns, state):
+    """JSON lines; no state"""
+    ids, values, times = columns
+    # payload value = the raw bytes read big-endian, which for <= 8 bytes
+    # is cheaper than int(data, 16)'s generic parse
+    from_bytes = int.from_bytes
+    fromhex = bytes.fromhex
+    f.seek(offset)
+    tail = b""
+    # read READ_CHUNK bytes at a time and split each chunk into lines
+    # with one C call; the bytes after the last newline carry over
+    while True:
+        chunk = f.read(READ_CHUNK)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            offset += len(line) + 1
+            if not line.strip():
                 continue
-            value = int(rec["data"], 16) if len(rec["data"])<=2 else None
-            if value is None:
+            rec = loads(line)
+            raw = fromhex(rec["data"])
+            if len(raw) > 8:
+                continue  # CAN FD payload, does not fit one value
+            ids.append(rec["arbitration_id"])
+            values.append(from_bytes(raw, "big"))
+            times.append(rec["timestamp"])
+    # a non-empty tail is a partial last line, left for the next run
+    return offset, state
+
+def _parse_msgpack(f, offset, columns, base_ns):
+    """
+    msgpack monitor log: each monitor run starts with a {"base_ns": wall
+    clock ns} header, then (ns since previous record, id, data) records.
+    Absolute times are the running sum of the deltas, so the state is
+    the timestamp of the last record read, in ns.
+    """
+    if msgpack is None:
+        raise RuntimeError("reading a msgpack monitor log needs the msgpack package (pip install msgpack)")
+    ids, values, times = columns
+    from_bytes = int.from_bytes
+    f.seek(offset)
+    unpacker = msgpack.Unpacker(f, raw=False, read_size=READ_CHUNK)
+    for rec in unpacker:
+        if rec.__class__ is dict:
+            base_ns = rec["base_ns"]
+            continue
+        delta, arbitration_id, raw = rec
+        base_ns += delta
+        if len(raw) > 8:
+            continue
+        ids.append(arbitration_id)
+        values.append(from_bytes(raw, "big"))
+        times.append(base_ns / 1e9)
+    # tell() stops at the end of the last complete record
+    return offset + unpacker.tell(), base_ns
+
+def _parse_columnar(f, offset, columns, state):
+    """Whole blocks of a utils.can_log file; no state"""
+    ids, values, times = columns
+    for offset, (t, i, v) in can_log.iter_blocks(f, offset):
+        times.extend(t)
+        ids.extend(i)
+        values.extend(v)
+    return offset, state
+
+def _log_parser(f):
+    """
+    Pick the parser from the start of the log: the can_log magic, the
+    msgpack header map (0x81), or JSONL's '{'
+    """
+    f.seek(0)
+    head = f.read(len(can_log.MAGIC))
+    if head == can_log.MAGIC:
+        return _parse_columnar
+    if head[:1] == MSGPACK_HEADER:
+        return _parse_msgpack
+    return _parse_jsonl
+
+def load_records(path=LOG):
+    """
+    Return (ids, values, times) columns for every classic CAN
+    frame in the monitor log, JSONL, msgpack or columnar (detected from
+    the first bytes). Only the part of the log not yet in the cache is parsed; a
+    partially written last record is left for next time. If the log
+    cannot be parsed on from the cached offset, the cache is dropped and
+    the whole log parsed again.
+    """
+    cache = path + ".cache"
+    with open(path, "rb", buffering=0) as f:
+        st = os.fstat(f.fileno())
+        columns, offset, state = _read_cache(cache, st, f)
+        cached_offset = offset
+        parse = _log_parser(f)
+        try:
+            offset, state = parse(f, offset, columns, state)
+        except (ValueError, KeyError, TypeError, struct.error):
+            if not cached_offset:
+                raise
+            columns = _empty_columns()
+            offset, state = parse(f, 0, columns, 0)
+            cached_offset = -1
+        if offset != cached_offset:
+            _write_cache(cache, st, f, columns, offset, state)
+    return columns
+
+if njit is not None:
+    @njit(cache=True)
+    def _scan(ids, vals, target, thr):
+        """
+        Fused single pass over the columns: returns (previous, current)
+        index pairs for every frame of `target` whose value moved by at
+        least thr since that id's previous frame.
+        """
+        out = np.empty((len(vals), 2), np.int64)
+        n = 0
+        prev = -1
+        for i in range(len(vals)):
+            if ids[i] != target:
                 continue
-            if last is not None and abs(value - last) >= threshold_delta:
-                print(f"[ALERT] sudden change {last} -> {value} at {rec['time']}")
-            last = value
+            if prev >= 0:
+                a = vals[prev]
+                b = vals[i]
+                # unsigned columns: subtract the smaller from the larger
+                if (b - a if b >= a else a - b) >= thr:
+                    out[n, 0] = prev
+                    out[n, 1] = i
+                    n += 1
+            prev = i
+        return out[:n]
+else:
+    _scan = None
+
+def _emit(alerts, stream=False):
+    """
+    Write alert lines to stdout: all in one write at the end of the scan,
+    or with stream=True in flushed batches of STREAM_BATCH as they come
+    """
+    write = sys.stdout.write
+    if not stream:
+        write("".join(alerts))
+        return
+    batch = []
+    for line in alerts:
+        batch.append(line)
+        if len(batch) == STREAM_BATCH:
+            write("".join(batch))
+            sys.stdout.flush()
+            batch.clear()
+    write("".join(batch))
+    sys.stdout.flush()
+
+def detect(threshold_delta=50, target_id="0x100", path=LOG, stream=False):
+    # deltas are absolute, so a negative threshold is meaningless (and the
+    # numba path's unsigned compare could not represent it)
+    if threshold_delta < 0:
+        raise ValueError(f"threshold_delta must be >= 0, got {threshold_delta}")
+    ids, values, times = load_records(path)
+    # one int to compare against the integer arbitration_id column; every
+    # cached record already has a classic (<= 8 byte) payload, so the id
+    # is the whole filter
+    target = parse_can_id(target_id)
+    if _scan is not None:
+        pairs = _scan(np.asarray(ids), np.asarray(values), target, np.uint64(threshold_delta))
+        _emit((f"[ALERT] sudden change {values[prev]} -> {values[i]} at {times[i]}\n"
+               for prev, i in pairs), stream)
+        return
+    # select the target's frames, then diff neighbours, as whole-column
+    # passes (compress/map run in C) instead of a per-record Python loop
+    mask = list(map(target.__eq__, ids))
+    vals = list(compress(values, mask))
+    stamps = list(compress(times, mask))
+    deltas = map(abs, map(sub, vals[1:], vals))
+    # alert text is only built for frames past the threshold
+    _emit((f"[ALERT] sudden change {vals[k]} -> {vals[k + 1]} at {stamps[k + 1]}\n"
+           for k, d in enumerate(deltas) if d >= threshold_delta), stream)
 
 if __name__ == "__main__":
-    detect()
+    # optional: log to scan (data/monitor.log, .msgpack or .canlog), and
+    # --stream to print alerts in flushed batches instead of all at the end
+    args = sys.argv[1:]
+    stream = "--stream" in args
+    if stream:
+        args.remove("--stream")
+    detect(path=args[0] if args else LOG, stream=stream)
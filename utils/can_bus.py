@@ -3,18 +3,138 @@
 Compatibility helper to create a python-can Bus while handling the
 deprecation of the 'bustype' argument (use 'interface' in newer python-can).
 """
-from typing import Optional
+import atexit
+import socket
+import struct
+import threading
+from typing import Any, Dict, Optional, Tuple, Union
 
-def make_bus(channel: Optional[str] = None, bustype: str = "virtual"):
+# Every possible one-byte payload, built once; index with value & 0xFF
+SINGLE_BYTE = tuple(bytes([i]) for i in range(256))
+
+# struct can_frame as the kernel sees it: id, dlc, 3 pad bytes, 8 data bytes
+CAN_FRAME = struct.Struct("=IB3x8s")
+CAN_EFF_FLAG = 0x80000000
+CAN_ERR_FLAG = 0x20000000
+CAN_EFF_MASK = 0x1FFFFFFF
+CAN_SFF_MASK = 0x000007FF
+
+# Keyword python-can's Bus takes for the backend name, worked out on the
+# first make_bus() call: "interface" (>= 4.2), "bustype" (older), or ""
+# when the signature cannot be read and make_bus has to probe
+_BUS_KWARG: Optional[str] = None
+
+def _bus_kwarg() -> str:
+    import can
+    import inspect
+    try:
+        params = inspect.signature(can.interface.Bus).parameters
+    except (TypeError, ValueError):
+        return ""
+    return "interface" if "interface" in params else "bustype"
+
+# Buses handed out by make_bus(cached=True), one per (bustype, channel),
+# shut down by close_all() at exit
+_BUSES: Dict[Tuple[str, Optional[str]], Any] = {}
+_BUSES_LOCK = threading.Lock()
+
+def make_bus(channel: Optional[str] = None, bustype: str = "virtual", cached: bool = True):
     """
-    Create and return a python-can Bus instance.
+    Return a python-can Bus for bustype/channel.
     - In python-can >= 4.2: uses interface=<bustype>
     - Fallback: uses bustype=<bustype> for older versions
+    The keyword is detected once from Bus's signature, not per call.
+    Repeat calls for the same (bustype, channel) return the same open bus
+    instead of initialising the driver again. Pass cached=False for a
+    private bus, e.g. a receiver: a virtual bus does not deliver a frame
+    to the instance that sent it, and receivers sharing one bus would
+    take each other's frames.
     """
+    if not cached:
+        return _open_bus(channel, bustype)
+    key = (bustype, channel)
+    with _BUSES_LOCK:
+        bus = _BUSES.get(key)
+        if bus is None or getattr(bus, "_is_shutdown", False):
+            bus = _BUSES[key] = _open_bus(channel, bustype)
+    return bus
+
+def close_all():
+    """Shut down every cached bus (registered with atexit)"""
+    with _BUSES_LOCK:
+        buses = list(_BUSES.values())
+        _BUSES.clear()
+    for bus in buses:
+        try:
+            bus.shutdown()
+        except Exception:
+            pass
+
+atexit.register(close_all)
+
+def _open_bus(channel: Optional[str], bustype: str):
+    global _BUS_KWARG
     import can
+    if _BUS_KWARG is None:
+        _BUS_KWARG = _bus_kwarg()
+    if _BUS_KWARG:
+        return can.interface.Bus(channel=channel, **{_BUS_KWARG: bustype})
     try:
         # Preferred in python-can >= 4.2
         return can.interface.Bus(interface=bustype, channel=channel)
     except TypeError:
         # Older python-can: expects bustype=
         return can.interface.Bus(bustype=bustype, channel=channel)
+
+def parse_can_id(value: Union[int, str]) -> int:
+    """
+    Normalize a CAN ID to int. Strings are read as hex ("0x100" or "100"),
+    ints pass through. Call this once where input enters the program so
+    attack loops only ever see ints.
+    """
+    if isinstance(value, str):
+        return int(value, 16)
+    return int(value)
+
+def pack_frame(can_id: int, data: bytes, extended: bool = False) -> bytes:
+    """
+    Pack one classic CAN frame for a raw SocketCAN socket. Build these once
+    outside send loops; the result is a plain bytes object.
+    """
+    if extended:
+        can_id |= CAN_EFF_FLAG
+    return CAN_FRAME.pack(can_id, len(data), data)
+
+def _decode_frame(can_id: int, dlc: int, data: bytes) -> Optional[tuple]:
+    if can_id & CAN_ERR_FLAG:
+        return None
+    if can_id & CAN_EFF_FLAG:
+        return can_id & CAN_EFF_MASK, data[:dlc]
+    return can_id & CAN_SFF_MASK, data[:dlc]
+
+def unpack_frames(buf) -> list:
+    """
+    Decode a buffer of back-to-back struct can_frames read from a raw
+    socket into (arbitration_id, data) pairs, in one iter_unpack pass;
+    error frames come back as None
+    """
+    return [_decode_frame(*f) for f in CAN_FRAME.iter_unpack(buf)]
+
+def make_raw_socketcan(channel: Optional[str]) -> Optional[socket.socket]:
+    """
+    Open a CAN_RAW socket bound to `channel`, bypassing python-can's
+    per-send overhead. Returns None when raw SocketCAN is not available
+    (non-Linux, no such interface), so callers can fall back to bus.send.
+    """
+    if not channel or not hasattr(socket, "CAN_RAW"):
+        return None
+    try:
+        s = socket.socket(socket.PF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+    except OSError:
+        return None
+    try:
+        s.bind((channel,))
+    except OSError:
+        s.close()
+        return None
+    return s
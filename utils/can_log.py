@@ -0,0 +1,75 @@
+# utils/can_log.py
+"""
+Columnar binary monitor log shared by monitor_bus (writer) and
+tools/detect_spoof (reader).
+
+The file starts with MAGIC, followed by blocks appended one per writer
+batch. Each block is a little-endian u32 record count, then its columns
+back to back: timestamps (f8), arbitration ids (u4) and payloads (u8, the
+data bytes read big-endian). A reader can pull a whole column into an
+array with one call instead of decoding a record at a time. Payloads longer than 8 bytes (CAN FD) do not fit a u8 and are
+not stored.
+"""
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Iterator, Tuple
+
+MAGIC = b"LHCANLG2"
+BLOCK = struct.Struct("<I")
+
+# array typecodes of the (times, ids, values) columns
+COLUMN_TYPES = ("d", "I", "Q")
+RECORD_SIZE = sum(array(t).itemsize for t in COLUMN_TYPES)
+
+_SWAP = sys.byteorder == "big"
+
+def encode_block(frames) -> bytes:
+    """One block of bytes for a batch of (timestamp, id, data) tuples"""
+    if any(len(data) > 8 for _, _, data in frames):
+        frames = [f for f in frames if len(f[2]) <= 8]
+        if not frames:
+            return b""
+    times, ids, payloads = zip(*frames)
+    from_bytes = int.from_bytes
+    columns = (
+        array("d", times),
+        array("I", ids),
+        array("Q", [from_bytes(data, "big") for data in payloads]),
+    )
+    parts = [BLOCK.pack(len(times))]
+    for col in columns:
+        if _SWAP:
+            col.byteswap()
+        parts.append(col.tobytes())
+    return b"".join(parts)
+
+def iter_blocks(f: BinaryIO, offset: int) -> Iterator[Tuple[int, Tuple[array, ...]]]:
+    """
+    Yield (end offset, (times, ids, values)) for each complete
+    block from `offset` on; `offset` is just past MAGIC or a previous
+    block's end. A partially written last block is left alone.
+    """
+    if offset == 0:
+        offset = len(MAGIC)
+    f.seek(offset)
+    while True:
+        head = f.read(BLOCK.size)
+        if len(head) < BLOCK.size:
+            return
+        count, = BLOCK.unpack(head)
+        body = f.read(count * RECORD_SIZE)
+        if len(body) < count * RECORD_SIZE:
+            return
+        columns = []
+        pos = 0
+        for typecode in COLUMN_TYPES:
+            col = array(typecode)
+            end = pos + count * col.itemsize
+            col.frombytes(body[pos:end])
+            if _SWAP:
+                col.byteswap()
+            columns.append(col)
+            pos = end
+        offset += BLOCK.size + len(body)
+        yield offset, tuple(columns)
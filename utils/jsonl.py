@@ -0,0 +1,36 @@
+# utils/jsonl.py
+"""
+JSON Lines helpers shared by the attack loggers and log readers.
+Uses orjson when it is installed and falls back to the stdlib json module.
+"""
+from typing import Any, Iterator
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps_line(obj: Any) -> bytes:
+        """Serialize obj to one JSONL line (bytes, newline included)"""
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+else:
+    import json
+    loads = json.loads  # accepts str and bytes
+
+    def dumps_line(obj: Any) -> bytes:
+        """Serialize obj to one JSONL line (bytes, newline included)"""
+        return (json.dumps(obj) + "\n").encode()
+
+def iter_jsonl(path: str) -> Iterator[Any]:
+    """
+    Yield one decoded record per non-blank line of a JSONL file.
+    Lines are read as bytes and parsed one at a time, so memory stays flat
+    no matter how large the capture is.
+    """
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)